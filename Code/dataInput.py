@@ -8,9 +8,108 @@ import datetime
 import numpy as np
 import pandas as pd
 import json
-import os
 
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# daily demand files larger than this (in bytes) are read a few stores at a time
+_STREAMING_THRESHOLD = 64 * 1024**2
+
+def _numericDtypes(fileAddress: Path, dtype: type = np.float64)->Dict[str, type]:
+    """
+    Reads only the header of a csv with the stores in the first column and
+    maps that column to str and every other column to dtype, so read_csv
+    can skip inferring the column types.
+    """
+    columns = pd.read_csv(fileAddress, sep=',', nrows=0).columns
+    return {column: (str if i == 0 else dtype) for i, column in enumerate(columns)}
+
+# --------------------------------------------------------------
+# The csv files are parsed once per path and modification time (so a rewritten
+# file is parsed again) and the cached results are kept immutable, each public
+# reader hands back a fresh copy that callers can edit. Only a few versions are
+# kept so stale results are dropped.
+
+@lru_cache(maxsize=4)
+def _readLocationGroupsCached(fileAddress: Path, modified: int)->Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    """Parses the location groups csv into (region, stores) pairs"""
+    # read the input which is the csv file and comma is the delimiter
+    locationGroupData = pd.read_csv(fileAddress, sep=',', dtype=str)
+    
+    # the regions have different numbers of stores so the shorter columns are padded with NaN
+    return tuple((column, tuple(locationGroupData[column].dropna().str.replace('_', ' ', regex=False)))
+                 for column in locationGroupData.columns)
+
+@lru_cache(maxsize=4)
+def _readAverageDemandsCached(fileAddress: Path, modified: int)->Tuple[Tuple[str, ...], Tuple[str, ...], np.ndarray]:
+    """Parses the average demands csv into (days, stores, read-only demand array)"""
+    averageDemands = pd.read_csv(fileAddress, sep=',',index_col=0, dtype=_numericDtypes(fileAddress))
+    averageDemands['WeekdayAvg'] = np.nanmean(averageDemands[['Monday','Tuesday','Wednesday','Thursday','Friday']].to_numpy(), axis=1)
+
+    values = averageDemands.to_numpy()
+    values.flags.writeable = False
+
+    return tuple(averageDemands.columns), tuple(averageDemands.index), values
+
+def _readAverageDemandsArray(fileAddress: str)->Tuple[Tuple[str, ...], Tuple[str, ...], np.ndarray]:
+    """Returns the cached (days, stores, read-only demand array) for the current version of an average demands csv"""
+    fileAddress = Path(fileAddress)
+    return _readAverageDemandsCached(fileAddress, fileAddress.stat().st_mtime_ns)
+
+@lru_cache(maxsize=4)
+def _readTravelDurationsCached(fileAddress: Path, modified: int)->pd.DataFrame:
+    """Parses the travel durations csv, converting the values to hours"""
+    # dividing the whole frame at once
+    return pd.read_csv(fileAddress,sep=',',index_col=0, dtype=_numericDtypes(fileAddress)) / 3600.0
+
+@lru_cache(maxsize=4)
+def _readDemandMatrixCached(fileAddress: Path, modified: int)->Tuple[pd.Index, np.ndarray, np.ndarray]:
+    """Parses the daily demands csv into (stores, read-only demand matrix, weekday of each column)"""
+    df = pd.read_csv(fileAddress, dtype=_numericDtypes(fileAddress)).set_index('Store')
+
+    values = df.to_numpy()
+    values.flags.writeable = False
+    weekdays = pd.to_datetime(df.columns).weekday.to_numpy()
+    weekdays.flags.writeable = False
+
+    return df.index, values, weekdays
+
+def _readDemandStatsChunked(fileAddress: Path, weekdays: List[int], statistics: Dict[str, Callable[[np.ndarray], np.ndarray]], 
+                            chunkSize: int = 16)->Tuple[pd.Index, Dict[str, np.ndarray]]:
+    """
+    Reads the columns of the daily demands csv falling on the given weekdays
+    chunkSize stores at a time, applying each statistic to the rows of every
+    chunk. Each row holds all of a store's days so only one chunk needs to be
+    kept in memory.
+    """
+    dtypes = _numericDtypes(fileAddress)
+    storeColumn, dayColumns = list(dtypes)[0], list(dtypes)[1:]
+    validColumns = [column for column, day in zip(dayColumns, pd.to_datetime(dayColumns).weekday) if day in weekdays]
+
+    stores, results = [], {name: [] for name in statistics}
+    for chunk in pd.read_csv(fileAddress, dtype=dtypes, usecols=[storeColumn] + validColumns, index_col=storeColumn, chunksize=chunkSize):
+        values = chunk[validColumns].to_numpy()
+        stores.append(chunk.index)
+        for name, statistic in statistics.items():
+            results[name].append(statistic(values))
+
+    return stores[0].append(stores[1:]), {name: np.concatenate(result) for name, result in results.items()}
+
+def _readDemandStats(fileAddress: Path, weekdays: List[int], statistics: Dict[str, Callable[[np.ndarray], np.ndarray]])->Tuple[pd.Index, Dict[str, np.ndarray]]:
+    """
+    Applies each statistic to every store's demands on the given weekdays, 
+    files larger than _STREAMING_THRESHOLD are streamed instead of being loaded (and cached) whole.
+    """
+    if fileAddress.stat().st_size > _STREAMING_THRESHOLD:
+        return _readDemandStatsChunked(fileAddress, weekdays, statistics)
+
+    stores, values, columnWeekdays = _readDemandMatrixCached(fileAddress, fileAddress.stat().st_mtime_ns)
+    validDays = values[:, np.isin(columnWeekdays, weekdays)]
+
+    return stores, {name: statistic(validDays) for name, statistic in statistics.items()}
+
+# --------------------------------------------------------------
 
 
 def readLocationGroups(fileAddress: str = "./Data/LocationGroups.csv")->Dict[str, List[str]]:
@@ -28,17 +127,10 @@ def readLocationGroups(fileAddress: str = "./Data/LocationGroups.csv")->Dict[str
          Stores in their region groups
     
     """
-    fileAddress = fileAddress.replace('/', os.sep)
-    # read the input which is the csv file and comma is the delimiter
-    locationGroupData = pd.read_csv(fileAddress, sep=',')
-    
-    # res is a dictionary
-    res = {}
-    for column in locationGroupData.columns:
-        temp = list(locationGroupData[column][:]) + [np.NaN]
-        temp = temp[:temp.index(np.NaN)]
-        temp = [store.replace('_', ' ') if '_' in store else store for store in temp ]
-        res[column] = temp   
+    fileAddress = Path(fileAddress)
+
+    # res is a dictionary, copying the cached stores into new lists
+    res = {region: list(stores) for region, stores in _readLocationGroupsCached(fileAddress, fileAddress.stat().st_mtime_ns)}
     
     # returns the dictionary res
     return res
@@ -58,15 +150,13 @@ def readAverageDemands(fileAddress: str = "./Data/AverageDemands.csv", roundUp:
          Stores and the demands for all store from Monday to Saturday
     
     """
-    fileAddress = fileAddress.replace('/', os.sep)
-    averageDemands = pd.read_csv(fileAddress, sep=',',index_col=0)
-    averageDemands['WeekdayAvg'] = averageDemands[['Monday','Tuesday','Wednesday','Thursday','Friday']].mean(numeric_only=True, axis=1)
+    days, stores, values = _readAverageDemandsArray(fileAddress)
 
-    stores = averageDemands.index
+    # converting the whole array at once rather than indexing each cell
     if roundUp:
-        res = {day: {store: np.ceil(averageDemands[day][store]) for store in stores} for day in averageDemands.columns}
-    else:
-        res = {day: {store: averageDemands[day][store] for store in stores} for day in averageDemands.columns}
+        values = np.ceil(values)
+
+    res = {days[j]: dict(zip(stores, values[:, j].tolist())) for j in range(len(days))}
     
     # return stores, res
     return res
@@ -85,9 +175,9 @@ def readTravelDurations(fileAddress: str = "./Data/WoolworthsTravelDurations.csv
     Dataframe: Adjacency matrix for the stores with the durations in hours
     
     """
-    fileAddress = fileAddress.replace('/', os.sep)
-    # Returns a transformed dataframe
-    return pd.read_csv(fileAddress,sep=',',index_col=0).applymap(lambda x: x/3600)
+    fileAddress = Path(fileAddress)
+    # Returns a copy of the transformed dataframe
+    return _readTravelDurationsCached(fileAddress, fileAddress.stat().st_mtime_ns).copy()
 
 def readStoreCoordinates(fileAddress: str = "./Data/WoolworthsLocations.csv")->pd.DataFrame:
     """
@@ -102,8 +192,9 @@ def readStoreCoordinates(fileAddress: str = "./Data/WoolworthsLocations.csv")->p
     ------
     Dataframe: Latitude and longtitude of each Woolworth supermarket
     """
-    fileAddress = fileAddress.replace('/', os.sep)
-    return pd.read_csv(fileAddress, sep=",",usecols=['Store','Lat','Long']).set_index('Store')
+    fileAddress = Path(fileAddress)
+    return pd.read_csv(fileAddress, sep=",",usecols=['Store','Lat','Long'],
+                       dtype={'Store': str, 'Lat': np.float64, 'Long': np.float64}).set_index('Store')
     
 def storeRoutes(partitions, fileAddress='Data/newRoutes.json'):
     """
@@ -117,11 +208,11 @@ def storeRoutes(partitions, fileAddress='Data/newRoutes.json'):
      fileAddress: str
                   name of the file to store the data in, should be a json
     """
-    fileAddress = fileAddress.replace('/', os.sep)
-    fp = open(fileAddress, mode='w')
+    fileAddress = Path(fileAddress)
 
-    json.dump(partitions,fp)
-    fp.close()
+    # json.dumps encodes in one call using the C encoder, json.dump streams through the python one
+    with open(fileAddress, mode='w') as fp:
+        fp.write(json.dumps(partitions))
     return
 
 def readRoutes(fileAddress='Data/newRoutes.json'):
@@ -138,11 +229,10 @@ def readRoutes(fileAddress='Data/newRoutes.json'):
           Contains routes
     
     """
-    fileAddress = fileAddress.replace('/', os.sep)
-    fp = open(fileAddress, mode='r')
+    fileAddress = Path(fileAddress)
 
-    temp = json.load(fp)
-    fp.close()
+    with open(fileAddress, mode='r') as fp:
+        temp = json.loads(fp.read())
     return temp
 
 def readDataWithStats(fileAddress: str = 'Data/WoolworthsDemands.csv', roundUp: bool = False):
@@ -158,75 +248,56 @@ def readDataWithStats(fileAddress: str = 'Data/WoolworthsDemands.csv', roundUp:
     newDf: DataFrame
     
     '''
-    fileAddress = fileAddress.replace('/', os.sep)
-
-    df = pd.read_csv(fileAddress).set_index('Store')
-    df.columns = pd.to_datetime(df.columns)
-    
-    # geting weekdays 
-    validDays = [d for d in df.columns if d.weekday() < 5] # weekday columns
-    # print(df[:5])
-    demands = df.loc[:,validDays].mean(axis=1)
-    # mins    = df.loc[:,validDays].min(axis=1)
-    stds   = df.loc[:,validDays].std(axis=1)
-    # maxs    = df.loc[:,validDays].max(axis=1)
-    # print(maxs[:5])
+    fileAddress = Path(fileAddress)
+
+    # statistics of the weekday (monday to friday) demands
+    stores, statistics = _readDemandStats(fileAddress, [0, 1, 2, 3, 4], {
+        "Demand": lambda days: np.nanmean(days, axis=1),
+        # "min": lambda days: np.nanmin(days, axis=1),
+        # "max": lambda days: np.nanmax(days, axis=1),
+        "std": lambda days: np.nanstd(days, axis=1, ddof=1),
+    })
     
-    # newDf = pd.DataFrame(columns=["Store", "Demand", "min", "max", "std"])
-    newDf = pd.DataFrame(columns=["Store", "Demand", "std"])
-    newDf["Store"] = df.index
-    newDf.set_index("Store", inplace=True)
-
-    newDf["Demand"] = demands.values
-    # newDf["min"] = mins.values
-    # newDf["max"] = maxs.values
-    newDf["std"] = stds.values
+    newDf = pd.DataFrame(statistics, index=stores.rename("Store"))
 
     if roundUp:
-        for column in newDf.columns:
-            newDf[column] = newDf[column].apply(np.ceil)
+        newDf = np.ceil(newDf)
     
     return newDf
 
 
-def readSaturdayWithStats(fileAddress: str = "Data/WoolworthsDemands.csv", roundUp: bool = False):
+def readSaturdayWithStats(fileAddress: str = "Data/WoolworthsDemands.csv", roundUp: bool = False, withExtremes: bool = False):
     '''
     
     Parameters
     ----------
     fileAddress: str
                  Pallet demands for each supermarket for a four-week period
+
+    withExtremes: bool
+                  Whether to include the min and max saturday demands of each store
     
     Returns
     -------
     newDf: DataFrame
     
     '''
-    fileAddress = fileAddress.replace('/', os.sep)
+    fileAddress = Path(fileAddress)
 
-    df = pd.read_csv(fileAddress).set_index('Store')
-    df.columns = pd.to_datetime(df.columns)
-    
-    # geting weekdays 
-    validDays = [d for d in df.columns if d.weekday() == 5] # saturday column
-    # print(df[:5])
-    demands = df.loc[:,validDays].mean(axis=1)
-    mins    = df.loc[:,validDays].min(axis=1)
-    maxs    = df.loc[:,validDays].max(axis=1)
-
-    # print(maxs[:5])
-    newDf = pd.DataFrame(columns=["Store", "Demand", "min", "max"])
-    newDf["Store"] = df.index
-    newDf["Demand"] = demands.values
-    newDf["min"] = mins.values
-    newDf["max"] = maxs.values
-
-    newDf = newDf[newDf["Demand"] > 0]
-    newDf.set_index("Store", inplace=True)
+    # statistics of the saturday demands
+    saturdayStatistics = {"Demand": lambda days: np.nanmean(days, axis=1)}
+    if withExtremes:
+        saturdayStatistics["min"] = lambda days: np.nanmin(days, axis=1)
+        saturdayStatistics["max"] = lambda days: np.nanmax(days, axis=1)
+
+    stores, statistics = _readDemandStats(fileAddress, [5], saturdayStatistics)
+
+    # only keeping the stores open on saturday
+    isOpen = statistics["Demand"] > 0
+    newDf = pd.DataFrame({name: values[isOpen] for name, values in statistics.items()}, index=stores[isOpen].rename("Store"))
 
     if roundUp:
-        for column in newDf.columns:
-            newDf[column] = newDf[column].apply(np.ceil)
+        newDf = np.ceil(newDf)
 
     return newDf
 
@@ -244,23 +315,31 @@ def readLocationGroupsWithStoreClosure(toClose: List[List[str]])->Dict[str, List
     return stores
     
 
-def readDemandsWithStoreClosure(toClose: List[List[str]], transferRatio = 0.5, roundUp: bool = False):
-    demandDict = readAverageDemands()
+def readDemandsWithStoreClosure(toClose: List[List[str]], transferRatio = 0.5, roundUp: bool = False, 
+                                fileAddress: str = "./Data/AverageDemands.csv"):
+    days, stores, values = _readAverageDemandsArray(fileAddress)
+    storeIndex = {store: i for i, store in enumerate(stores)}
 
-    for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]:
-        del demandDict[day]
+    # working on the (rounded up) average demands as an array, one column per day
+    closureDays = ["Saturday", "WeekdayAvg"]
+    demands = np.ceil(values[:, [days.index(day) for day in closureDays]])
+    isOpen = np.ones(len(stores), dtype=bool)
 
-    
     for storeGroups in toClose:    
-        demandDict["WeekdayAvg"][storeGroups[1]] += demandDict["WeekdayAvg"][storeGroups[0]]*transferRatio
-        demandDict["Saturday"][storeGroups[1]] += demandDict["Saturday"][storeGroups[0]]*transferRatio
-        del demandDict["WeekdayAvg"][storeGroups[0]]
-        del demandDict["Saturday"][storeGroups[0]]
+        closed, kept = storeIndex[storeGroups[0]], storeIndex[storeGroups[1]]
+        for i in (closed, kept):
+            if not isOpen[i]:
+                raise ValueError(f"{stores[i]} has already been closed")
+
+        demands[kept] += demands[closed]*transferRatio
+        demands[closed] = 0
+        isOpen[closed] = False
 
     if roundUp:
-        for day in demandDict:
-            for store in demandDict[day]:
-                demandDict[day][store] = np.ceil(demandDict[day][store])
+        demands = np.ceil(demands)
+
+    openStores = [store for store, storeOpen in zip(stores, isOpen) if storeOpen]
+    demandDict = {day: dict(zip(openStores, demands[isOpen, j].tolist())) for j, day in enumerate(closureDays)}
         
     return demandDict
 
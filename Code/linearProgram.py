@@ -7,10 +7,15 @@ import numpy as np
 import pandas as pd
 from pulp import *
 
+from collections import defaultdict
 from typing import List
 
+# durations are passed to the LP in thousandths of an hour (the precision main.calculateDuration rounds to),
+# this keeps every coefficient an exact integer
+_DURATION_SCALE = 1000
 
-def findBestPartition(day: str, region: str, routes: List[List[str]], stores: List[str], durations: List[float], maxTrucks: int = 60, disp: bool = False):
+
+def findBestPartition(day: str, region: str, routes: List[List[str]], stores: List[str], durations: List[float], maxTrucks: int = 60, disp: bool = False, threads: int = None):
     '''  
         Parameters
         ---------
@@ -27,11 +32,16 @@ def findBestPartition(day: str, region: str, routes: List[List[str]], stores: Li
                     Woolworth NZ operated supermarket stores in Auckland
                     
             durations: list of floats
-                        Travel durations in seconds between each pair of stores and distribution points
+                        Total duration of each route in hours (travel plus unloading), rounded to
+                        the nearest 0.001 hours for the LP; the 4 hour overtime threshold and 
+                        25 hour duration bound are in the same units
                     
             maxTrucks: int
                     Number of trucks available which is 60
 
+            threads: int
+                    Number of threads CBC may use, None leaves it at CBC's default
+
         Returns
         -------
             routesChosen: np.array
@@ -43,19 +53,21 @@ def findBestPartition(day: str, region: str, routes: List[List[str]], stores: Li
 
     '''
 
-    # Variable of cost
-    cost = lambda x: 225*x + 50 * max(0,x-4)
+    # Scaled duration and cost of each route, calculated for all routes at once
+    routeDurations = np.rint(np.asarray(durations, dtype=float)*_DURATION_SCALE).astype(np.int64)
+    costs = 225*routeDurations + 50*np.maximum(0, routeDurations - 4*_DURATION_SCALE)
         
     # variable for whether a route is chosen 
-    possibleRoutes = [LpVariable(region+f"_route_{i}", 0, 1, LpInteger) for i in range(len(routes))]
+    possibleRoutes = [LpVariable(f"r{i}", cat=LpBinary) for i in range(len(routes))]
 
+    # slack is in the same scaled units as the durations, the whole objective is scaled by the same factor
     slackTime = LpVariable("slack_time", 0, cat=LpContinuous)
     
     # The variable 'routing_model' to contain the problem data where the objective is to minimise
     routing_model = pulp.LpProblem(f"{day}_{region}_RoutingModel", LpMinimize)
 
     # Objective Function is added to 'routing_model'
-    routing_model += (pulp.lpSum([cost(durations[i]) * possibleRoutes[i] for i in range(len(routes))]) + slackTime*10000)
+    routing_model += (LpAffineExpression(list(zip(possibleRoutes, costs.tolist()))) + slackTime*10000)
 
     # specify the maximum number of trucks
     routing_model += (
@@ -65,30 +77,33 @@ def findBestPartition(day: str, region: str, routes: List[List[str]], stores: Li
 
     # Cant specify an average duration constraint since the denominator will change, this assumes 6 ish routes per region
     routing_model += (
-        pulp.lpSum([durations[i] * possibleRoutes[i] for i in range(len(routes))]) - slackTime <= 25,
+        LpAffineExpression(list(zip(possibleRoutes, routeDurations.tolist()))) - slackTime <= 25*_DURATION_SCALE,
         "Average_duration_constraint",
     )
 
+    # indices of the routes which visit each store, found in a single pass over the routes
+    coverage = defaultdict(list)
+    for i, route in enumerate(routes):
+        for store in route:
+            coverage[store].append(i)
+
     # A store must be only visited once
     for store in stores:
         routing_model += (
             # for each store, checks whether only one route satisfies it
-            pulp.lpSum([possibleRoutes[i] for i in range(len(routes)) if store in routes[i]]) == 1,
+            pulp.lpSum([possibleRoutes[i] for i in coverage[store]]) == 1,
             f"Must_supply_{store}",
         )
 
     # routing_model.writeLP(f"LPFiles/{day}{region}.lp")
     # The routing_model is solved using PULP_CBC_CMD
-    routing_model.solve(PULP_CBC_CMD(msg=disp))
+    routing_model.solve(PULP_CBC_CMD(msg=disp, threads=threads))
 
-    # Initialising the array routesChosen
-    routesChosen = []
-    
-    # Iterating through the routes
-    for i in range(len(routes)):
-        if possibleRoutes[i].value() == 1.0:
-            
-            routesChosen.append(routes[i])
+    # Reading all the variable values at once, unsolved variables have a value of None
+    chosen = np.fromiter((route.varValue or 0 for route in possibleRoutes), dtype=float, count=len(possibleRoutes))
+
+    # The routes whose variable is (up to solver tolerance) one are chosen
+    routesChosen = [routes[i] for i in np.flatnonzero(np.rint(chosen) == 1)]
             
     # The routes chosen and status of the solution is returned
     return routesChosen, LpStatus[routing_model.status] == "Optimal"
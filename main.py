@@ -5,9 +5,11 @@ from Code import dataInput, routing, linearProgram
 
 import pandas as pd
 import numpy as np
+import os
 from scipy import stats
 from matplotlib import pyplot as plt
 
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Tuple
 
 #--------------------------------------------------------------------------------------------
@@ -67,10 +69,21 @@ def eliminatePoorRoutes(routes, demands, minLenToKeep: int = 2, maxDuration: flo
     newRoutes = [routes[i] for i in range(len(durations)) if durations[i] < maxDuration or len(routes[i]) <= minLenToKeep]
     return newRoutes
 
+def solveRegion(day: str, region: str, regionalDemands: Dict[str, float], 
+                centroid_mean_ratio: float, max_stores: int, traffic_multiplier: float,
+                min_route_length: int, max_duration: float, lpDisplay: bool, solverThreads: int = None):
+    """Generates the routes for a single region and finds the best partition of them, the arguments must be picklable."""
+    routes = getRoutes(regionalDemands, removeOutliers=centroid_mean_ratio, maxStops=max_stores)
+    routes = eliminatePoorRoutes(routes, regionalDemands, minLenToKeep=min_route_length, maxDuration=max_duration)
+    stores = list(regionalDemands.keys())
+    durations = [calculateDuration(route, regionalDemands, multiplier=traffic_multiplier) for route in routes]
+
+    return linearProgram.findBestPartition(day, region, routes, stores, durations, disp=lpDisplay, threads=solverThreads)
+
 def findInitalSolution(day: str, demands: Dict[str, float], locations: Dict[str,List[str]], 
                        centroid_mean_ratio: float, max_stores: int, traffic_multiplier: float,
                        min_route_length: int, max_duration: float, lpDisplay: bool):
-    """Finds the solutions for a given day..."""
+    """Finds the solutions for a given day, solving the regions in parallel..."""
     
     # demands = dataInput.readAverageDemands(roundUp=True)
     # locations = dataInput.readLocationGroups()
@@ -79,15 +92,29 @@ def findInitalSolution(day: str, demands: Dict[str, float], locations: Dict[str,
     solution = {}
     solutionStatus = True
 
+    # the regions are independent so each is solved in its own process (at most one per core),
+    # the cores are shared out between the CBC solves of the workers
+    cores = os.cpu_count() or 1
+    workers = min(len(locations), cores)
+    solverThreads = max(1, cores // workers)
+
+    regionalArgs = {}
     for region in locations.keys():
         regionalDemands = {location: demands[day][location] for location in locations[region] if demands[day][location] > 0}
 
-        routes = getRoutes(regionalDemands, removeOutliers=centroid_mean_ratio, maxStops=max_stores)
-        routes = eliminatePoorRoutes(routes, regionalDemands, minLenToKeep=min_route_length, maxDuration=max_duration)
-        stores = regionalDemands.keys()
-        durations = [calculateDuration(route, regionalDemands, multiplier=traffic_multiplier) for route in routes]
+        regionalArgs[region] = dict(day=day, region=region, regionalDemands=regionalDemands, 
+                                    centroid_mean_ratio=centroid_mean_ratio, max_stores=max_stores, 
+                                    traffic_multiplier=traffic_multiplier, min_route_length=min_route_length, 
+                                    max_duration=max_duration, lpDisplay=lpDisplay, solverThreads=solverThreads)
+
+    if workers == 1: # no point starting a process when there is only one core
+        results = {region: solveRegion(**args) for region, args in regionalArgs.items()}
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {region: executor.submit(solveRegion, **args) for region, args in regionalArgs.items()}
+            results = {region: future.result() for region, future in futures.items()}
 
-        regionalSolution, problemStatus = linearProgram.findBestPartition(day, region, routes, stores, durations, disp=lpDisplay)
+    for region, (regionalSolution, problemStatus) in results.items():
         
         solution[region] = regionalSolution
         solutionStatus = solutionStatus and problemStatus
@@ -228,7 +255,7 @@ def simulateUncertainty(initialSolutions: Dict[str, List[str]], days: List[str]
 
     demands = {
         "WeekdayAvg": dataInput.readDataWithStats(roundUp=localSettings["round_up"]), 
-        "Saturday": dataInput.readSaturdayWithStats(roundUp=localSettings["round_up"])
+        "Saturday": dataInput.readSaturdayWithStats(roundUp=localSettings["round_up"], withExtremes=True)
     }
     
     simulationResults = {}
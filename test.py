@@ -65,6 +65,22 @@ def checkAverageDuration(partition, day):
 def checkNumberOfTrucks(partition):
     return len(partition) <= 60
 
+def checkChunkedDemandStats():
+    """Function to check that streaming the demands csv gives the same stats as reading it whole"""
+    readers = [lambda: dataInput.readDataWithStats(), lambda: dataInput.readSaturdayWithStats(withExtremes=True)]
+
+    inMemory = [reader() for reader in readers]
+
+    # forcing every file to be streamed
+    threshold, dataInput._STREAMING_THRESHOLD = dataInput._STREAMING_THRESHOLD, 0
+    try:
+        streamed = [reader() for reader in readers]
+    finally:
+        dataInput._STREAMING_THRESHOLD = threshold
+
+    return all(a.index.equals(b.index) and list(a.columns) == list(b.columns) and np.allclose(a.to_numpy(), b.to_numpy()) 
+               for a, b in zip(inMemory, streamed))
+
 def verifySolutionValidity(partitions, day):
     print(f"\n\n\t\tTesting {day}:\n\t\t-------{'-'*len(day)}-\n")
     
@@ -115,4 +131,8 @@ if __name__ == "__main__":
     
     for testDay in ['WeekdayAvg', 'Saturday']:
         verifySolutionValidity(testPartitions[testDay], testDay)
+
+    statement ="TESTING DATA INPUT:"
+    print(f"\n\n\t\t{statement}\n\t\t{'-'*len(statement)}\n")
+    print(f"Result for [Chunked Demand Stats Check]:\t{TEST_RESULT(checkChunkedDemandStats())}")
     